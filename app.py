@@ -1,7 +1,15 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import bisect
+import calendar
 import csv
-from datetime import datetime, date, time, timedelta
+import functools
+import json
+import os
+import re
+from collections import defaultdict
+from datetime import datetime, date, time
 
 # Page configuration
 st.set_page_config(
@@ -15,11 +23,59 @@ SERVICES_CSV = "services.csv"
 SERVICE_TYPES_CSV = "service_types.csv"
 
 
-def load_csv(file_path):
-    """Load CSV file with proper quoting"""
+# Cached helpers below take file mtimes only as part of their cache key, so
+# editing a CSV invalidates everything derived from it
+def get_file_mtime(file_path):
+    """Return the modification time of a file, or None if it doesn't exist"""
     try:
+        return os.path.getmtime(file_path)
+    except OSError:
+        return None
+
+
+# First number in a "number of pets" value (e.g. "2 pets" -> 2)
+_PETS_RE = re.compile(r'(\d+)')
+
+# Flag columns that lookups filter on, always loaded as booleans
+BOOLEAN_COLUMNS = ('is_active',)
+
+# Weekday names indexed by date.weekday() (0=Monday)
+WEEKDAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+# Month names indexed by date.month - 1
+MONTH_NAMES = ('January', 'February', 'March', 'April', 'May', 'June',
+               'July', 'August', 'September', 'October', 'November', 'December')
+
+
+@st.cache_data(show_spinner=False)
+def _load_csv_cached(file_path, mtime, normalize=False):
+    """Parse a CSV file into a DataFrame"""
+    try:
+        # Arrow's multi-threaded parser, returning Arrow-backed columns
+        df = pd.read_csv(file_path, engine='pyarrow', dtype_backend='pyarrow', keep_default_na=False)
+    except (ValueError, ImportError):
+        # pyarrow unavailable or unable to parse this file - use the C engine
         df = pd.read_csv(file_path, quoting=csv.QUOTE_ALL, keep_default_na=False)
-        return df
+    if normalize:
+        # Real booleans for flag columns and any other column holding only "true"/"false"
+        # (blank or other values keep the column as strings, as read_csv itself would)
+        for col in df.columns:
+            values = df[col].astype('string').str.lower().fillna('')
+            unique_values = set(values.unique())
+            is_boolean_like = bool(unique_values) and unique_values <= {'true', 'false'}
+            if col in BOOLEAN_COLUMNS or is_boolean_like:
+                df[col] = (values == 'true').astype(bool)
+    return df
+
+
+def load_csv(file_path, normalize=False):
+    """Load CSV file with proper quoting (cached until the file changes)
+
+    Pass normalize=True for read-only lookups to get boolean-like columns
+    as bool. Editable tables keep the raw dtypes.
+    """
+    try:
+        return _load_csv_cached(file_path, get_file_mtime(file_path), normalize)
     except FileNotFoundError:
         st.error(f"File {file_path} not found!")
         return pd.DataFrame()
@@ -31,17 +87,18 @@ def load_csv(file_path):
 def save_csv(df, file_path):
     """Save DataFrame to CSV with proper quoting to match original format"""
     try:
-        # Convert DataFrame to CSV string with proper quoting
-        output = df.to_csv(
+        # Write straight to the file with proper quoting
+        df.to_csv(
+            file_path,
             index=False,
             quoting=csv.QUOTE_ALL,
             lineterminator="\n",
-            doublequote=True  # Use double quotes to escape quotes within fields
+            doublequote=True,  # Use double quotes to escape quotes within fields
+            encoding='utf-8'
         )
         
-        # Write to file
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(output)
+        # Make sure the next load sees the new contents
+        _load_csv_cached.clear()
         
         return True
     except Exception as e:
@@ -54,9 +111,13 @@ def get_next_id(df, id_column="id"):
     if df.empty or id_column not in df.columns:
         return 1
     try:
-        # Convert to numeric, handling any non-numeric values
-        numeric_ids = pd.to_numeric(df[id_column], errors='coerce')
-        max_id = numeric_ids.max()
+        ids = df[id_column]
+        # Integer columns (the usual case) can skip the numeric conversion
+        if pd.api.types.is_integer_dtype(ids.dtype):
+            max_id = ids.max()
+        else:
+            # Convert to numeric, handling any non-numeric values
+            max_id = pd.to_numeric(ids, errors='coerce').max()
         if pd.isna(max_id):
             return 1
         return int(max_id) + 1
@@ -79,47 +140,63 @@ def duplicate_rows(df, row_indices, id_column="id"):
     # Generate new IDs for duplicated rows
     if id_column in duplicated_rows.columns:
         next_id = get_next_id(df, id_column)
-        for idx in range(len(duplicated_rows)):
-            duplicated_rows.iloc[idx, duplicated_rows.columns.get_loc(id_column)] = next_id + idx
+        duplicated_rows[id_column] = np.arange(next_id, next_id + len(duplicated_rows), dtype=np.int64)
     
     # Append duplicated rows to dataframe
     new_df = pd.concat([df, duplicated_rows], ignore_index=True)
     return new_df
 
 
-def create_new_row(df, id_column="id"):
-    """Create a new row with default values"""
-    new_row = {}
+@st.cache_data(show_spinner=False)
+def _column_defaults(file_path, mtime):
+    """Return default values for each column of a CSV file"""
+    df = load_csv(file_path)
+    defaults = {}
     for col in df.columns:
-        if col == id_column:
-            new_row[col] = get_next_id(df, id_column)
-        elif col == "created_at":
-            from datetime import datetime
-            new_row[col] = f'"{datetime.now().isoformat()}Z"'
-        else:
-            # Set default values based on column type and sample data
-            if df[col].dtype == 'int64':
-                new_row[col] = 0
-            elif df[col].dtype == 'float64':
-                new_row[col] = 0.0
-            elif df[col].dtype == 'object':
-                # Check if it's a boolean-like column or other string type
-                if len(df) > 0:
-                    sample_val = str(df[col].iloc[0]).lower()
-                    if sample_val in ['true', 'false']:
-                        new_row[col] = "false"
-                    elif sample_val.startswith('"') and sample_val.endswith('"'):
-                        new_row[col] = '""'
-                    else:
-                        new_row[col] = ""
+        # Set default values based on column type and sample data
+        dtype = df[col].dtype
+        if pd.api.types.is_integer_dtype(dtype):
+            defaults[col] = 0
+        elif pd.api.types.is_float_dtype(dtype):
+            defaults[col] = 0.0
+        elif pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+            # Check if it's a boolean-like column or other string type
+            if len(df) > 0:
+                sample_val = str(df[col].iloc[0]).lower()
+                if sample_val in ['true', 'false']:
+                    defaults[col] = "false"
+                elif sample_val.startswith('"') and sample_val.endswith('"'):
+                    defaults[col] = '""'
                 else:
-                    new_row[col] = ""
+                    defaults[col] = ""
             else:
-                new_row[col] = ""
+                defaults[col] = ""
+        else:
+            defaults[col] = ""
+    return defaults
+
+
+def create_new_row(df, file_path, id_column="id"):
+    """Create a new row with default values"""
+    new_row = dict(_column_defaults(file_path, get_file_mtime(file_path)))
+    # Columns added in the editor but not yet saved to the file
+    for col in df.columns:
+        new_row.setdefault(col, "")
+    if id_column in new_row:
+        new_row[id_column] = get_next_id(df, id_column)
+    if "created_at" in new_row:
+        new_row["created_at"] = f'"{datetime.now().isoformat()}Z"'
     
     return new_row
 
 
+@functools.lru_cache(maxsize=None)
+def _table_state_keys(title):
+    """Return the session state and data editor keys for a table title"""
+    slug = title.replace(' ', '_').lower()
+    return f"df_{slug}", f"editor_{slug}"
+
+
 def render_editable_table(df, file_path, title, id_column="id"):
     """Render an editable table with CRUD operations"""
     st.header(title)
@@ -129,14 +206,11 @@ def render_editable_table(df, file_path, title, id_column="id"):
         return df
     
     # Initialize session state for this table
-    state_key = f"df_{title.replace(' ', '_').lower()}"
-    editor_key = f"editor_{title.replace(' ', '_').lower()}"
+    state_key, editor_key = _table_state_keys(title)
     
     # Load initial data if not in session state
-    if state_key not in st.session_state:
-        st.session_state[state_key] = df.copy()
-    
-    current_df = st.session_state[state_key]
+    # (load_csv already hands out a fresh copy of the cached DataFrame)
+    current_df = st.session_state.setdefault(state_key, df)
     
     # Reload button in top right
     col1, col2 = st.columns([1, 1])
@@ -158,150 +232,157 @@ def render_editable_table(df, file_path, title, id_column="id"):
     
     # Update session state when dataframe is edited
     # Streamlit automatically updates editor_key in session_state when edited
-    st.session_state[state_key] = edited_df.copy()
+    # and data_editor already returns a new object, so no copy is needed
+    st.session_state[state_key] = edited_df
     
     return edited_df
 
 
-def get_service_types():
-    """Load service types and return dataframe with name and uses_end_date"""
-    df = load_csv(SERVICE_TYPES_CSV)
+@st.cache_data(show_spinner=False)
+def _get_service_types_cached(mtime):
+    """Return the active service types"""
+    df = load_csv(SERVICE_TYPES_CSV, normalize=True)
     if df.empty:
         return df
     # Filter to active service types
     if 'is_active' in df.columns:
-        # Convert to string to handle any type issues
-        df['is_active'] = df['is_active'].astype(str)
-        df = df[df['is_active'].str.lower() == 'true']
+        df = df[df['is_active']]
+    # Ids are only ever compared as strings; assign returns a new frame rather
+    # than writing into the filtered slice
+    if 'id' in df.columns:
+        df = df.assign(id=df['id'].astype(str))
     return df
 
 
-def get_service_type_id(service_type_name, service_types_df):
-    """Get service_type_id for a given service type name"""
+def get_service_types():
+    """Load service types and return dataframe with name and uses_end_date"""
+    return _get_service_types_cached(get_file_mtime(SERVICE_TYPES_CSV))
+
+
+def build_service_type_lookups(service_types_df):
+    """Build name -> id and name -> uses_end_date lookup dicts for service types"""
     if service_types_df.empty or 'name' not in service_types_df.columns:
-        return None
-    matching_row = service_types_df[service_types_df['name'] == service_type_name]
-    if matching_row.empty or 'id' not in matching_row.columns:
-        return None
-    return str(matching_row.iloc[0]['id'])
+        return {}, {}
+    # Keep the first row for each name, matching a filtered lookup
+    unique_types = service_types_df.drop_duplicates(subset='name')
+    names = unique_types['name']
+    name_to_id = {}
+    if 'id' in unique_types.columns:
+        name_to_id = dict(zip(names, unique_types['id'].astype(str)))
+    name_to_uses = {}
+    if 'uses_end_date' in unique_types.columns:
+        name_to_uses = {name: str(value).lower() for name, value in zip(names, unique_types['uses_end_date'])}
+    return name_to_id, name_to_uses
+
+
+def get_service_type_id(service_type_name, name_to_id):
+    """Get service_type_id for a given service type name"""
+    return name_to_id.get(service_type_name)
 
 
-def get_service_type_uses_end_date(service_type_name, service_types_df):
+def get_service_type_uses_end_date(service_type_name, name_to_uses):
     """Get uses_end_date value for a given service type name"""
-    if service_types_df.empty or 'name' not in service_types_df.columns:
-        return "false"
-    matching_row = service_types_df[service_types_df['name'] == service_type_name]
-    if matching_row.empty or 'uses_end_date' not in matching_row.columns:
-        return "false"
-    return str(matching_row.iloc[0]['uses_end_date']).lower()
+    return name_to_uses.get(service_type_name, "false")
 
 
-def get_duration_options(service_type_id):
-    """Get duration options from services.csv filtered by service_type_id"""
-    if not service_type_id:
-        return []
+def build_duration_options(services_df):
+    """Map each service_type_id to its sorted duration options from services.csv"""
+    if services_df.empty or 'service_type_id' not in services_df.columns:
+        return {}
     
-    services_df = load_csv(SERVICES_CSV)
-    if services_df.empty:
-        return []
-    
-    # Filter to active services matching the service_type_id
+    # Filter to active services
     if 'is_active' in services_df.columns:
-        services_df['is_active'] = services_df['is_active'].astype(str)
-        services_df = services_df[services_df['is_active'].str.lower() == 'true']
+        services_df = services_df[services_df['is_active']]
     
-    if 'service_type_id' not in services_df.columns:
-        return []
-    
-    # Filter by service_type_id
-    matching_services = services_df[services_df['service_type_id'].astype(str) == str(service_type_id)]
-    
-    if matching_services.empty:
-        return []
-    
-    duration_options = set()
-    
-    for _, service in matching_services.iterrows():
-        try:
-            min_duration = int(float(service.get('min_duration', 0)))
-            max_duration_val = service.get('max_duration', 0)
-            granularity = int(float(service.get('duration_granularity', 1)))
-            
-            # Handle max_duration = 0 (unlimited) - generate options up to a reasonable limit
-            if max_duration_val == 0 or max_duration_val == '0':
-                # Generate options up to 1440 minutes (24 hours) in granularity steps
-                max_duration = 1440
-                current = min_duration
-                while current <= max_duration:
-                    duration_options.add(current)
-                    current += granularity
-            else:
-                max_duration = int(float(max_duration_val))
+    duration_options_by_type = {}
+    for service_type_id, matching_services in services_df.groupby('service_type_id'):
+        duration_options = set()
+        
+        for _, service in matching_services.iterrows():
+            try:
+                min_duration = int(float(service.get('min_duration', 0)))
+                max_duration_val = service.get('max_duration', 0)
+                granularity = int(float(service.get('duration_granularity', 1)))
+                
+                # Handle max_duration = 0 (unlimited) - generate options up to 1440 minutes (24 hours)
+                if max_duration_val == 0 or max_duration_val == '0':
+                    max_duration = 1440
+                else:
+                    max_duration = int(float(max_duration_val))
+                
                 # Generate options from min to max with granularity step
-                current = min_duration
-                while current <= max_duration:
-                    duration_options.add(current)
-                    current += granularity
-            
-            # Always include min_duration
-            duration_options.add(min_duration)
-            
-        except (ValueError, TypeError):
-            continue
+                options = np.arange(min_duration, max_duration + 1, max(granularity, 1), dtype=np.int32)
+                duration_options.update(options.tolist())
+                
+                # Always include min_duration
+                duration_options.add(min_duration)
+                
+            except (ValueError, TypeError):
+                continue
+        
+        if duration_options:
+            duration_options_by_type[str(service_type_id)] = sorted(duration_options)
     
-    # Sort and return as list
-    return sorted(list(duration_options))
+    return duration_options_by_type
+
+
+@st.cache_data(show_spinner=False)
+def _duration_options_cached(mtime):
+    """Return duration options per service type from services.csv"""
+    return build_duration_options(load_csv(SERVICES_CSV, normalize=True))
+
+
+def closest_option_index(sorted_options, value):
+    """Return the index of the option closest to value (the lower one on ties)"""
+    idx = bisect.bisect_left(sorted_options, value)
+    if idx == len(sorted_options):
+        return idx - 1
+    if idx > 0 and sorted_options[idx] != value:
+        # Pick whichever neighbour is nearer
+        if value - sorted_options[idx - 1] <= sorted_options[idx] - value:
+            return idx - 1
+    return idx
+
+
+def get_duration_options(service_type_id, duration_options_by_type):
+    """Get duration options for a service type from the precomputed map"""
+    if not service_type_id:
+        return []
+    return duration_options_by_type.get(str(service_type_id), [])
 
 
 def add_months(start_date, months):
     """Add months to a date, handling edge cases like month-end dates"""
-    year = start_date.year
-    month = start_date.month + months
-    
-    # Handle year overflow
-    while month > 12:
-        month -= 12
-        year += 1
-    while month < 1:
-        month += 12
-        year -= 1
+    # Count months from year 0 so divmod handles year overflow in both directions
+    total_months = start_date.year * 12 + (start_date.month - 1) + months
+    year, month = divmod(total_months, 12)
+    month += 1
     
     # Handle day overflow (e.g., Jan 31 + 1 month = Feb 28/29)
-    try:
-        return date(year, month, start_date.day)
-    except ValueError:
-        # Day doesn't exist in target month (e.g., Jan 31 -> Feb 31)
-        # Go to last day of target month
-        if month == 12:
-            next_month = date(year + 1, 1, 1)
-        else:
-            next_month = date(year, month + 1, 1)
-        last_day = (next_month - timedelta(days=1)).day
-        return date(year, month, last_day)
+    day = min(start_date.day, calendar.monthrange(year, month)[1])
+    return date(year, month, day)
 
 
 def initialize_appointment_sections():
     """Initialize appointment sections in session state"""
-    if 'appointment_sections' not in st.session_state:
-        st.session_state['appointment_sections'] = [{}]
+    st.session_state.setdefault('appointment_sections', [{}])
 
 
 def add_appointment_section():
     """Add a new appointment section"""
-    if 'appointment_sections' not in st.session_state:
-        st.session_state['appointment_sections'] = []
-    st.session_state['appointment_sections'].append({})
+    st.session_state.setdefault('appointment_sections', []).append({})
 
 
 def remove_appointment_section(section_idx):
     """Remove an appointment section by index"""
-    if 'appointment_sections' in st.session_state:
-        if 0 <= section_idx < len(st.session_state['appointment_sections']):
-            st.session_state['appointment_sections'].pop(section_idx)
-            st.rerun()
+    sections = st.session_state.get('appointment_sections', [])
+    if 0 <= section_idx < len(sections):
+        sections.pop(section_idx)
+        st.rerun()
 
 
-def render_appointment_section(section_idx, section_data, service_types_df, use_sidebar=False):
+def render_appointment_section(section_idx, section_data, service_type_names, name_to_id, name_to_uses,
+                               duration_options_by_type, use_sidebar=False):
     """Render form for a single appointment section"""
     # Create expander - use sidebar if requested, otherwise main area
     if use_sidebar:
@@ -312,7 +393,6 @@ def render_appointment_section(section_idx, section_data, service_types_df, use_
     # All widgets must be created inside the expander context
     with expander:
         # Service Type Dropdown
-        service_type_names = service_types_df['name'].tolist() if not service_types_df.empty else []
         if not service_type_names:
             st.warning("No service types available. Please add service types first.")
             return
@@ -326,7 +406,7 @@ def render_appointment_section(section_idx, section_data, service_types_df, use_
         )
         
         # Get uses_end_date for selected service type
-        uses_end_date = get_service_type_uses_end_date(selected_service_type, service_types_df)
+        uses_end_date = get_service_type_uses_end_date(selected_service_type, name_to_uses)
         
         # Update section data
         section_data['service_type'] = selected_service_type
@@ -355,19 +435,19 @@ def render_appointment_section(section_idx, section_data, service_types_df, use_
         
         if uses_end_date == "false":
             # Show duration field with options from services.csv
-            service_type_id = get_service_type_id(selected_service_type, service_types_df)
-            duration_options = get_duration_options(service_type_id)
+            service_type_id = get_service_type_id(selected_service_type, name_to_id)
+            duration_options = get_duration_options(service_type_id, duration_options_by_type)
             
             if duration_options:
                 current_duration = section_data.get('duration', duration_options[0])
                 # Find closest option if current duration doesn't match exactly
-                if current_duration not in duration_options:
-                    current_duration = min(duration_options, key=lambda x: abs(x - current_duration))
+                # (duration_options is sorted, so bisect instead of scanning)
+                duration_index = closest_option_index(duration_options, current_duration)
                 
                 duration = st.selectbox(
                     "Duration (minutes)",
                     options=duration_options,
-                    index=duration_options.index(current_duration) if current_duration in duration_options else 0,
+                    index=duration_index,
                     key=f"duration_{section_idx}"
                 )
             else:
@@ -413,10 +493,12 @@ def render_appointment_section(section_idx, section_data, service_types_df, use_
         if 'customers' not in section_data or not isinstance(section_data.get('customers'), list):
             section_data['customers'] = [{"number_of_pets": "1 pet", "price_tier": "Price Tier 1"}]
         
-        # Ensure all existing customers have price_tier field
-        for customer in section_data['customers']:
-            if 'price_tier' not in customer:
-                customer['price_tier'] = "Price Tier 1"
+        # Ensure all existing customers have price_tier field (once per section;
+        # customers added afterwards always include it)
+        if not section_data.get('_migrated_v1'):
+            for customer in section_data['customers']:
+                customer.setdefault('price_tier', "Price Tier 1")
+            section_data['_migrated_v1'] = True
         
         customers_list = section_data['customers']
         
@@ -450,14 +532,12 @@ def render_appointment_section(section_idx, section_data, service_types_df, use_
                 if len(customers_list) > 1:
                     if st.button("Remove", key=f"remove_customer_{section_idx}_{customer_idx}", type="secondary"):
                         customers_list.pop(customer_idx)
-                        st.session_state['appointment_sections'][section_idx] = section_data
                         st.rerun()
         
         # Add Customer button
         if st.button("➕ Add Customer", key=f"add_customer_{section_idx}"):
+            # customers_list is section_data's own list, which session state already holds
             customers_list.append({"number_of_pets": "1 pet", "price_tier": "Price Tier 1"})
-            section_data['customers'] = customers_list
-            st.session_state['appointment_sections'][section_idx] = section_data
             st.rerun()
         
         # Update section data
@@ -520,9 +600,8 @@ def render_appointment_section(section_idx, section_data, service_types_df, use_
                 )
                 section_data['recurring_frequency'] = recurring_frequency
             
-            # Days of Week Checkboxes (only show if frequency is "week")
+            # Days of Week selector (only show if frequency is "week")
             if recurring_frequency == "week":
-                st.write("Days of Week:")
                 days_of_week = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
                 selected_days = section_data.get('recurring_days', [])
                 
@@ -534,22 +613,15 @@ def render_appointment_section(section_idx, section_data, service_types_df, use_
                     # Update section_data with the default day
                     section_data['recurring_days'] = selected_days
                 
-                cols = st.columns(7)
-                recurring_days = []
-                for idx, day in enumerate(days_of_week):
-                    with cols[idx]:
-                        checkbox_key = f"recurring_day_{day}_{section_idx}"
-                        # Use session state value if exists, otherwise use default
-                        should_be_checked = day in selected_days
-                        checkbox_value = st.session_state.get(checkbox_key, should_be_checked)
-                        
-                        is_checked = st.checkbox(
-                            day[0],  # Show first letter: M, T, W, etc.
-                            value=checkbox_value,
-                            key=checkbox_key
-                        )
-                        if is_checked:
-                            recurring_days.append(day)
+                # One widget for all seven days, seeded from the section on first render
+                days_key = f"recurring_days_{section_idx}"
+                st.session_state.setdefault(days_key, selected_days)
+                recurring_days = st.multiselect(
+                    "Days of Week",
+                    options=days_of_week,
+                    format_func=lambda day: day[:3],  # Show short name: Mon, Tue, etc.
+                    key=days_key
+                )
                 section_data['recurring_days'] = recurring_days
             else:
                 # Clear recurring_days if frequency is not week
@@ -566,7 +638,7 @@ def render_appointment_section(section_idx, section_data, service_types_df, use_
             if st.button("Remove Section", key=f"remove_section_{section_idx}", type="secondary"):
                 remove_appointment_section(section_idx)
         
-        # Update session state
+        # Update session state once with all of this section's changes
         st.session_state['appointment_sections'][section_idx] = section_data
 
 
@@ -594,34 +666,72 @@ def format_duration_minutes(minutes):
         return str(minutes)
 
 
-def calculate_pay_rate_per_hour(service, tier):
-    """Calculate pay rate per hour based on tier"""
-    try:
-        recommended_staff_rate = float(service.get('recommended_staff_rate', 0))
-        charge_block_duration = float(service.get('charge_block_duration', 60))
-        
-        # Convert to per-hour rate (charge_block_duration is in minutes)
-        if charge_block_duration > 0:
-            rate_per_hour = (recommended_staff_rate / charge_block_duration) * 60
-        else:
-            rate_per_hour = recommended_staff_rate
-        
-        # Add tier adjustment
-        tier_adjustment = float(tier) * 0.01  # tier 1 = 0.01, tier 2 = 0.02, tier 3 = 0.03
-        return rate_per_hour + tier_adjustment
-    except (ValueError, TypeError):
-        return 0.0
+def format_duration_minutes_series(minutes):
+    """Convert a Series of minutes to human-readable format in one vectorized pass"""
+    numeric = pd.to_numeric(minutes, errors='coerce')
+    total = numeric.fillna(0).astype(np.int64).to_numpy()
+    
+    days, remainder = np.divmod(total, 1440)
+    hours, mins = np.divmod(remainder, 60)
+    
+    # Build each "N unit(s)" part, blank where the value is zero
+    parts = []
+    for values, unit in ((days, "day"), (hours, "hour"), (mins, "minute")):
+        labels = np.char.add(values.astype(str), np.where(values != 1, f" {unit}s", f" {unit}"))
+        parts.append(np.where(values > 0, labels, ""))
+    
+    formatted = pd.Series(
+        np.char.add(np.char.add(np.char.add(parts[0], " "), np.char.add(parts[1], " ")), parts[2]),
+        index=minutes.index
+    )
+    formatted = formatted.str.replace(r"\s+", " ", regex=True).str.strip().replace("", "0 minutes")
+    
+    # Fall back to the raw value for anything that isn't a number
+    invalid = numeric.isna().to_numpy()
+    if invalid.any():
+        formatted[invalid] = minutes[invalid].map(str)
+    return formatted
 
 
-def calculate_price_rate(service, tier):
-    """Calculate price based on tier"""
-    try:
-        recommended_customer_rate = float(service.get('recommended_customer_rate', 0))
-        # Add tier adjustment
-        tier_adjustment = float(tier) * 0.01  # tier 1 = 0.01, tier 2 = 0.02, tier 3 = 0.03
-        return recommended_customer_rate + tier_adjustment
-    except (ValueError, TypeError):
+def _column_or_default(df, column, default):
+    """Return a column of df, or a column filled with default if df doesn't have it"""
+    if column in df.columns:
+        return df[column]
+    return pd.Series(default, index=df.index)
+
+
+def calculate_pay_rates_per_hour(services_df, tier):
+    """Calculate pay rate per hour for every service based on tier"""
+    recommended_staff_rate = pd.to_numeric(_column_or_default(services_df, 'recommended_staff_rate', 0), errors='coerce').fillna(0)
+    charge_block_duration = pd.to_numeric(_column_or_default(services_df, 'charge_block_duration', 60), errors='coerce').fillna(60)
+    
+    # Convert to per-hour rate (charge_block_duration is in minutes)
+    rate_per_hour = np.where(
+        charge_block_duration > 0,
+        recommended_staff_rate / charge_block_duration.where(charge_block_duration > 0, 1) * 60,
+        recommended_staff_rate
+    )
+    
+    # Add tier adjustment
+    tier_adjustment = float(tier) * 0.01  # tier 1 = 0.01, tier 2 = 0.02, tier 3 = 0.03
+    return pd.Series(rate_per_hour + tier_adjustment, index=services_df.index)
+
+
+def calculate_price_rate(recommended_customer_rate, tier):
+    """Calculate price based on tier (a rate of None means it isn't a number)"""
+    if recommended_customer_rate is None:
         return 0.0
+    # Add tier adjustment
+    tier_adjustment = float(tier) * 0.01  # tier 1 = 0.01, tier 2 = 0.02, tier 3 = 0.03
+    return recommended_customer_rate + tier_adjustment
+
+
+def calculate_price_rates(services_df, tier):
+    """Calculate price for every service based on tier"""
+    recommended_customer_rate = pd.to_numeric(_column_or_default(services_df, 'recommended_customer_rate', 0), errors='coerce').fillna(0)
+    # Add tier adjustment
+    tier_adjustment = float(tier) * 0.01  # tier 1 = 0.01, tier 2 = 0.02, tier 3 = 0.03
+    return recommended_customer_rate + tier_adjustment
 
 
 def render_pay_tiers_tab():
@@ -629,8 +739,8 @@ def render_pay_tiers_tab():
     st.header("Pay Tiers")
     
     # Load services and service types
-    services_df = load_csv(SERVICES_CSV)
-    service_types_df = load_csv(SERVICE_TYPES_CSV)
+    services_df = load_csv(SERVICES_CSV, normalize=True)
+    service_types_df = load_csv(SERVICE_TYPES_CSV, normalize=True)
     
     if services_df.empty:
         st.warning("No services found. Please add services first.")
@@ -642,13 +752,11 @@ def render_pay_tiers_tab():
     
     # Filter to active services
     if 'is_active' in services_df.columns:
-        services_df['is_active'] = services_df['is_active'].astype(str)
-        services_df = services_df[services_df['is_active'].str.lower() == 'true']
+        services_df = services_df[services_df['is_active']]
     
-    # Join with service types to get service type names
-    services_df['service_type_id'] = services_df['service_type_id'].astype(str)
+    # Join with service types to get service type names, comparing ids as plain strings
     service_types_df['id'] = service_types_df['id'].astype(str)
-    merged_df = services_df.merge(
+    merged_df = services_df.assign(service_type_id=services_df['service_type_id'].astype(str)).merge(
         service_types_df[['id', 'name']],
         left_on='service_type_id',
         right_on='id',
@@ -662,22 +770,15 @@ def render_pay_tiers_tab():
     # Extract tier number (1, 2, or 3)
     tier_num = int(selected_tier.split()[-1])
     
-    # Calculate rates for each service
-    display_data = []
-    for _, service in merged_df.iterrows():
-        rate_per_hour = calculate_pay_rate_per_hour(service, tier_num)
-        charge_block_duration = service.get('charge_block_duration', '')
-        duration_display = format_duration_minutes(charge_block_duration)
-        display_data.append({
-            'Service Type': service.get('name', 'Unknown'),
-            'Number of Pets': service.get('number_of_pets', ''),
-            'Charge Block Duration': duration_display,
-            'Rate per Hour': f"£{rate_per_hour:.2f}"
+    # Calculate rates for all services at once
+    if not merged_df.empty:
+        rates_per_hour = calculate_pay_rates_per_hour(merged_df, tier_num)
+        display_df = pd.DataFrame({
+            'Service Type': merged_df['name'],
+            'Number of Pets': _column_or_default(merged_df, 'number_of_pets', ''),
+            'Charge Block Duration': format_duration_minutes_series(_column_or_default(merged_df, 'charge_block_duration', '')),
+            'Rate per Hour': rates_per_hour.map('£{:.2f}'.format)
         })
-    
-    # Create dataframe and display
-    if display_data:
-        display_df = pd.DataFrame(display_data)
         display_df = display_df.sort_values(['Service Type', 'Number of Pets'])
         st.dataframe(display_df, use_container_width=True, hide_index=True)
     else:
@@ -689,8 +790,8 @@ def render_price_tiers_tab():
     st.header("Price Tiers")
     
     # Load services and service types
-    services_df = load_csv(SERVICES_CSV)
-    service_types_df = load_csv(SERVICE_TYPES_CSV)
+    services_df = load_csv(SERVICES_CSV, normalize=True)
+    service_types_df = load_csv(SERVICE_TYPES_CSV, normalize=True)
     
     if services_df.empty:
         st.warning("No services found. Please add services first.")
@@ -702,13 +803,11 @@ def render_price_tiers_tab():
     
     # Filter to active services
     if 'is_active' in services_df.columns:
-        services_df['is_active'] = services_df['is_active'].astype(str)
-        services_df = services_df[services_df['is_active'].str.lower() == 'true']
+        services_df = services_df[services_df['is_active']]
     
-    # Join with service types to get service type names
-    services_df['service_type_id'] = services_df['service_type_id'].astype(str)
+    # Join with service types to get service type names, comparing ids as plain strings
     service_types_df['id'] = service_types_df['id'].astype(str)
-    merged_df = services_df.merge(
+    merged_df = services_df.assign(service_type_id=services_df['service_type_id'].astype(str)).merge(
         service_types_df[['id', 'name']],
         left_on='service_type_id',
         right_on='id',
@@ -722,235 +821,275 @@ def render_price_tiers_tab():
     # Extract tier number (1, 2, or 3)
     tier_num = int(selected_tier.split()[-1])
     
-    # Calculate rates for each service
-    display_data = []
-    for _, service in merged_df.iterrows():
-        price = calculate_price_rate(service, tier_num)
-        charge_block_duration = service.get('charge_block_duration', '')
-        duration_display = format_duration_minutes(charge_block_duration)
-        display_data.append({
-            'Service Type': service.get('name', 'Unknown'),
-            'Number of Pets': service.get('number_of_pets', ''),
-            'Charge Block Duration': duration_display,
-            'Price': f"£{price:.2f}"
+    # Calculate rates for all services at once
+    if not merged_df.empty:
+        prices = calculate_price_rates(merged_df, tier_num)
+        display_df = pd.DataFrame({
+            'Service Type': merged_df['name'],
+            'Number of Pets': _column_or_default(merged_df, 'number_of_pets', ''),
+            'Charge Block Duration': format_duration_minutes_series(_column_or_default(merged_df, 'charge_block_duration', '')),
+            'Price': prices.map('£{:.2f}'.format)
         })
-    
-    # Create dataframe and display
-    if display_data:
-        display_df = pd.DataFrame(display_data)
         display_df = display_df.sort_values(['Service Type', 'Number of Pets'])
         st.dataframe(display_df, use_container_width=True, hide_index=True)
     else:
         st.info("No services available to display.")
 
 
+def _weekday_mask(days_of_week):
+    """Return a 7-bit mask of the selected weekdays (bit 0 = Monday); no selection means every day"""
+    if not days_of_week:
+        return 0b1111111
+    mask = 0
+    for weekday, name in enumerate(WEEKDAY_NAMES):
+        if name in days_of_week:
+            mask |= 1 << weekday
+    return mask
+
+
+def _expand_daily_mask(start_ord, end_ord, step, mask):
+    """Return day ordinals from start_ord to end_ord, every step days, whose weekday bit is in mask"""
+    ords = np.arange(start_ord, end_ord + 1, step, dtype=np.int64)
+    # date.fromordinal(1) is a Monday, so (ordinal - 1) % 7 is the weekday
+    return ords[((mask >> ((ords - 1) % 7)) & 1).astype(bool)]
+
+
+def _expand_daily_dates(start_date, end_date, every, days_of_week):
+    """Return every 'every'th day from start_date to end_date that falls on a selected weekday"""
+    ords = _expand_daily_mask(start_date.toordinal(), end_date.toordinal(), every, _weekday_mask(days_of_week))
+    return list(map(date.fromordinal, ords.tolist()))
+
+
+@functools.lru_cache(maxsize=512)
 def generate_recurring_dates(start_date, end_date, frequency, every, days_of_week):
-    """Generate list of dates based on recurring rules"""
+    """Generate tuple of dates based on recurring rules
+
+    days_of_week must be a tuple so that results can be memoized.
+    """
     dates = []
     
     if frequency == "week":
-        # For weekly recurrence, check all selected days within each week
-        # Start from the beginning of the week containing start_date
-        days_mapping = {'Monday': 0, 'Tuesday': 1, 'Wednesday': 2, 'Thursday': 3, 
-                       'Friday': 4, 'Saturday': 5, 'Sunday': 6}
-        
-        # Get the weekday of start_date (0=Monday, 6=Sunday)
-        start_weekday = start_date.weekday()
+        # For weekly recurrence, check all selected days within each week, working
+        # on day ordinals from the Monday of the week containing start_date
+        start_ord = start_date.toordinal()
+        end_ord = end_date.toordinal()
+        week_start_ord = start_ord - start_date.weekday()
         
-        # Find the Monday of the week containing start_date
-        days_since_monday = start_weekday  # 0=Monday, 1=Tuesday, etc.
-        week_start = start_date - timedelta(days=days_since_monday)
+        # One range per selected weekday, stepping 'every' weeks at a time
+        ords = set()
+        for weekday, day_name in enumerate(WEEKDAY_NAMES):
+            if day_name in days_of_week:
+                first_ord = week_start_ord + weekday
+                # If this weekday falls before start_date, skip straight to its next occurrence
+                if first_ord < start_ord:
+                    first_ord += 7 * every
+                ords.update(range(first_ord, end_ord + 1, 7 * every))
         
-        # Iterate through each week
-        current_week_start = week_start
-        week_count = 0
-        
-        while True:
-            # Check if we should process this week (based on 'every' parameter)
-            if week_count % every == 0:
-                # Check all days in this week that match selected days_of_week
-                for day_name in days_of_week:
-                    day_offset = days_mapping[day_name]
-                    check_date = current_week_start + timedelta(days=day_offset)
-                    
-                    # Only add dates that are >= start_date and <= end_date
-                    if check_date >= start_date and check_date <= end_date:
-                        dates.append(check_date)
-            
-            # Move to next week
-            current_week_start += timedelta(weeks=1)
-            week_count += 1
-            
-            # Stop if the entire next week is past the end date
-            if current_week_start > end_date:
-                break
+        dates = list(map(date.fromordinal, sorted(ords)))
     else:
-        # For other frequencies, use the original logic
-        current_date = start_date
+        if frequency == "day":
+            dates = _expand_daily_dates(start_date, end_date, every, days_of_week)
+        elif frequency in ("month", "year"):
+            # Anchor each occurrence on start_date's day of month, clamped to the
+            # month's length (Jan 31 -> Feb 28/29 -> Mar 31), instead of drifting
+            step = every if frequency == "month" else 12 * every
+            start_month = np.datetime64(start_date, 'M')
+            span = int(np.datetime64(end_date, 'M') - start_month)
+            if span >= 0:
+                months = start_month + np.arange(0, span + 1, step)
+                month_starts = months.astype('datetime64[D]')
+                month_lengths = ((months + 1).astype('datetime64[D]') - month_starts).astype(int)
+                occurrences = month_starts + (np.minimum(start_date.day, month_lengths) - 1)
+                dates = occurrences[occurrences <= np.datetime64(end_date)].tolist()
+        elif start_date <= end_date:
+            # Unknown frequency: only the start date
+            dates = [start_date]
         
-        while current_date <= end_date:
-            # Check if current date matches selected days of week (if applicable)
-            if frequency == "day" or not days_of_week:
-                # For daily or no day filter, add all dates
-                dates.append(current_date)
-            else:
-                weekday_name = current_date.strftime('%A')
-                if weekday_name in days_of_week:
-                    dates.append(current_date)
-            
-            # Move to next date based on frequency
-            if frequency == "day":
-                current_date += timedelta(days=every)
-            elif frequency == "month":
-                # Approximate month as 30 days
-                current_date += timedelta(days=30 * every)
-            elif frequency == "year":
-                # Approximate year as 365 days
-                current_date += timedelta(days=365 * every)
-            else:
-                break
+        # Keep only the selected days of the week, if any (daily dates are already filtered)
+        if days_of_week and frequency != "day":
+            days_set = frozenset(days_of_week)
+            dates = [d for d in dates if WEEKDAY_NAMES[d.weekday()] in days_set]
     
     # Sort dates to ensure chronological order
     dates.sort()
-    return dates
+    return tuple(dates)
 
 
-def generate_appointments_from_sections():
-    """Generate appointments from all sections in session state"""
-    appointments = []
-    sections = st.session_state.get('appointment_sections', [])
+def _fingerprint(sections):
+    """Return a hash of the appointment sections' contents, including dates and times"""
+    return hash(json.dumps(sections, default=str, sort_keys=True))
+
+
+def _materialize_section(section_idx, section):
+    """Yield the appointments described by one appointment section"""
+    # Skip if section doesn't have required fields
+    if not section.get('service_type') or not section.get('start_date') or not section.get('start_time'):
+        return
     
-    for section_idx, section in enumerate(sections):
-        # Skip if section doesn't have required fields
-        if not section.get('service_type') or not section.get('start_date') or not section.get('start_time'):
-            continue
+    service_type = section.get('service_type')
+    start_date = section.get('start_date')
+    start_time = section.get('start_time')
+    uses_end_date = section.get('uses_end_date', 'false')
+    customers = section.get('customers', [])
+    staff_pay_tier = section.get('staff_pay_tier', 'Pay Tier 1')
+    is_recurring = section.get('is_recurring', False)
+    
+    # Determine appointment dates
+    if is_recurring:
+        recurring_end_date = section.get('recurring_end_date', start_date)
+        frequency = section.get('recurring_frequency', 'week')
+        every = section.get('recurring_every', 1)
+        days_of_week = section.get('recurring_days', [])
         
-        service_type = section.get('service_type')
-        start_date = section.get('start_date')
-        start_time = section.get('start_time')
-        uses_end_date = section.get('uses_end_date', 'false')
-        customers = section.get('customers', [])
-        staff_pay_tier = section.get('staff_pay_tier', 'Pay Tier 1')
-        is_recurring = section.get('is_recurring', False)
-        
-        # Determine appointment dates
-        if is_recurring:
-            recurring_end_date = section.get('recurring_end_date', start_date)
-            frequency = section.get('recurring_frequency', 'week')
-            every = section.get('recurring_every', 1)
-            days_of_week = section.get('recurring_days', [])
-            
-            if days_of_week:
-                appointment_dates = generate_recurring_dates(
-                    start_date, recurring_end_date, frequency, every, days_of_week
-                )
-            else:
-                # If no days selected, use start date only
-                appointment_dates = [start_date]
+        if days_of_week:
+            appointment_dates = generate_recurring_dates(
+                start_date, recurring_end_date, frequency, every, tuple(days_of_week)
+            )
         else:
+            # If no days selected, use start date only
             appointment_dates = [start_date]
-        
-        # Generate appointments for each date and each customer
-        for appointment_date in appointment_dates:
-            for customer_idx, customer in enumerate(customers):
-                number_of_pets = customer.get('number_of_pets', '1 pet')
-                price_tier = customer.get('price_tier', 'Price Tier 1')
-                
-                # Create appointment entry
-                appointment = {
-                    'service_type': service_type,
-                    'customer': f"Customer {customer_idx + 1}",
-                    'number_of_pets': number_of_pets,
-                    'date': appointment_date,
-                    'start_time': start_time,
-                    'staff_pay_tier': staff_pay_tier,
-                    'price_tier': price_tier,
-                    'is_recurring': is_recurring,
-                    'section_index': section_idx
-                }
-                
-                # Add duration or end_time based on uses_end_date
-                if uses_end_date == 'false':
-                    appointment['duration'] = section.get('duration', 60)
-                    appointment['end_time'] = None
-                else:
-                    appointment['duration'] = None
-                    appointment['end_time'] = section.get('end_time', time(17, 0))
-                
-                appointments.append(appointment)
+    else:
+        appointment_dates = [start_date]
     
-    return appointments
+    # Generate appointments for each date and each customer
+    for appointment_date in appointment_dates:
+        for customer_idx, customer in enumerate(customers):
+            number_of_pets = customer.get('number_of_pets', '1 pet')
+            price_tier = customer.get('price_tier', 'Price Tier 1')
+            
+            # Create appointment entry
+            appointment = {
+                'service_type': service_type,
+                'customer': f"Customer {customer_idx + 1}",
+                'number_of_pets': number_of_pets,
+                'date': appointment_date,
+                'start_time': start_time,
+                'staff_pay_tier': staff_pay_tier,
+                'price_tier': price_tier,
+                'is_recurring': is_recurring,
+                'section_index': section_idx
+            }
+            
+            # Add duration or end_time based on uses_end_date
+            if uses_end_date == 'false':
+                appointment['duration'] = section.get('duration', 60)
+                appointment['end_time'] = None
+            else:
+                appointment['duration'] = None
+                appointment['end_time'] = section.get('end_time', time(17, 0))
+            
+            yield appointment
 
 
-def calculate_invoice_data(appointments):
-    """Calculate invoice data grouped by service type and duration"""
-    if not appointments:
-        return []
-    
-    # Load services and service types
-    services_df = load_csv(SERVICES_CSV)
+def generate_appointments_from_sections(sections):
+    """Generate appointments from all appointment sections"""
+    return [
+        appointment
+        for section_idx, section in enumerate(sections)
+        for appointment in _materialize_section(section_idx, section)
+    ]
+
+
+@st.cache_data(show_spinner=False)
+def _merged_services_cached(services_mtime, service_types_mtime):
+    """Return active services joined with service type names"""
+    services_df = load_csv(SERVICES_CSV, normalize=True)
     service_types_df = get_service_types()
     
     if services_df.empty or service_types_df.empty:
-        return []
+        return pd.DataFrame()
     
     # Filter to active services
     if 'is_active' in services_df.columns:
-        services_df['is_active'] = services_df['is_active'].astype(str)
-        services_df = services_df[services_df['is_active'].str.lower() == 'true']
+        services_df = services_df[services_df['is_active']]
     
-    # Join with service types to get service type names
-    services_df['service_type_id'] = services_df['service_type_id'].astype(str)
-    service_types_df['id'] = service_types_df['id'].astype(str)
-    merged_services = services_df.merge(
+    # Join with service types to get service type names, comparing ids as plain strings
+    merged_services = services_df.assign(service_type_id=services_df['service_type_id'].astype(str)).merge(
         service_types_df[['id', 'name']],
         left_on='service_type_id',
         right_on='id',
         how='left'
     )
     
-    # Group appointments by service type and duration
-    invoice_dict = {}
+    # Durations are looked up by their string form and pets by number, so derive both once here
+    merged_services['_duration_key'] = _column_or_default(merged_services, 'charge_block_duration', '').astype(str)
+    merged_services['_pets_num'] = _column_or_default(merged_services, 'number_of_pets', '').map(_extract_pets_num).astype('Int64')
+    return merged_services
+
+
+def _build_merged_services():
+    """Return active services joined with service type names (cached until either CSV changes)"""
+    return _merged_services_cached(get_file_mtime(SERVICES_CSV), get_file_mtime(SERVICE_TYPES_CSV))
+
+
+@functools.lru_cache(maxsize=64)
+def _extract_pets_num(value):
+    """Return the first number in a number-of-pets value (e.g. "2 pets" -> 2), or None"""
+    match = _PETS_RE.search(str(value))
+    return int(match.group(1)) if match else None
+
+
+def build_price_index(merged_services):
+    """Index services by (service type name, duration, number of pets) for price lookups
+
+    Expects the frame from _build_merged_services. Values are recommended customer
+    rates as floats, or None when not a number. Each (name, duration) pair also gets
+    a (name, duration, None) entry holding its first service, used when no service
+    matches the number of pets.
+    """
+    if merged_services.empty:
+        return {}
+    
+    names = merged_services['name']
+    durations = merged_services['_duration_key']
+    pets_nums = merged_services['_pets_num']
+    if 'recommended_customer_rate' in merged_services.columns:
+        rates = merged_services['recommended_customer_rate'].tolist()
+    else:
+        rates = [0] * len(merged_services)
     
-    for apt in appointments:
-        service_type_name = apt.get('service_type', 'Unknown')
-        duration = apt.get('duration')
-        price_tier = apt.get('price_tier', 'Price Tier 1')
-        
-        # Skip if no duration (end_time based appointments)
-        if duration is None:
-            continue
-        
-        # Format duration for display
-        duration_display = format_duration_minutes(duration)
-        
-        # Create key: "Service Type - Duration"
-        key = f"{service_type_name} - {duration_display}"
-        
-        # Calculate price using the same function that considers number_of_pets
-        price = calculate_appointment_price(apt, merged_services)
-        if price is None:
-            price = 0.0
-        
-        # Aggregate
-        if key not in invoice_dict:
-            invoice_dict[key] = {
-                'Service Type - Duration': key,
-                'Count': 0,
-                'Total': 0.0
-            }
-        
-        invoice_dict[key]['Count'] += 1
-        invoice_dict[key]['Total'] += price
+    price_index = {}
+    for name, duration, pets_num, rate in zip(names, durations, pets_nums, rates):
+        # Only the recommended customer rate is needed for pricing; parse it once here
+        try:
+            rate = float(rate)
+        except (ValueError, TypeError):
+            rate = None
+        # Keep the first service for each key, as the row-by-row filtering did
+        price_index.setdefault((name, duration, None), rate)
+        if not pd.isna(pets_num):
+            price_index.setdefault((name, duration, int(pets_num)), rate)
+    return price_index
+
+
+@st.cache_resource(show_spinner=False)
+def _price_index_cached(services_mtime, service_types_mtime):
+    """Return the shared, read-only price index"""
+    return build_price_index(_build_merged_services())
+
+
+def get_price_index():
+    """Return the price index for the current services (cached until either CSV changes)"""
+    return _price_index_cached(get_file_mtime(SERVICES_CSV), get_file_mtime(SERVICE_TYPES_CSV))
+
+
+def aggregate_invoice_data(keys, prices):
+    """Sum appointment prices per "Service Type - Duration" key into invoice lines"""
+    if not keys:
+        return []
     
-    # Convert to list and sort
-    invoice_data = list(invoice_dict.values())
-    invoice_data.sort(key=lambda x: x['Service Type - Duration'])
+    # Aggregate per key; groupby returns the keys sorted
+    invoice_df = (
+        pd.DataFrame({'Service Type - Duration': keys, 'price': np.asarray(prices, dtype=float)})
+        .groupby('Service Type - Duration')
+        .agg(Count=('price', 'size'), Total=('price', 'sum'))
+        .reset_index()
+    )
     
-    return invoice_data
+    return invoice_df.to_dict('records')
 
 
-def calculate_appointment_price(apt, merged_services):
+def calculate_appointment_price(apt, price_index):
     """Calculate price for a single appointment"""
     service_type_name = apt.get('service_type', 'Unknown')
     duration = apt.get('duration')
@@ -961,116 +1100,134 @@ def calculate_appointment_price(apt, merged_services):
     if duration is None:
         return None
     
-    # Extract numeric value from number_of_pets (e.g., "1 pet" -> 1, "2 pets" -> 2)
-    pets_str = number_of_pets.strip().lower()
-    pets_num = None
-    for word in pets_str.split():
-        try:
-            pets_num = int(word)
-            break
-        except ValueError:
-            continue
-    
-    # If we couldn't extract a number, default to 1
+    # Extract numeric value from number_of_pets (e.g., "1 pet" -> 1, "2 pets" -> 2),
+    # defaulting to 1 if there isn't one
+    pets_num = _extract_pets_num(number_of_pets)
     if pets_num is None:
         pets_num = 1
     
-    # Find matching service by service type, duration, and number of pets
-    # First filter by service type and duration
-    matching_services = merged_services[
-        (merged_services['name'] == service_type_name) &
-        (merged_services['charge_block_duration'].astype(str) == str(duration))
-    ]
+    # Find matching service by service type, duration, and number of pets,
+    # falling back to the first service for that type and duration
+    duration_key = str(duration)
+    key = (service_type_name, duration_key, pets_num)
+    if key not in price_index:
+        key = (service_type_name, duration_key, None)
+        if key not in price_index:
+            return None
     
-    if matching_services.empty:
-        return None
-    
-    # Now try to match by number_of_pets
-    if 'number_of_pets' in matching_services.columns:
-        # Try to match exactly first
-        pets_exact_match = matching_services['number_of_pets'].astype(str).str.strip().str.lower() == pets_str
-        exact_matches = matching_services[pets_exact_match]
-        
-        if not exact_matches.empty:
-            matching_services = exact_matches
-        else:
-            # Try to extract number from service's number_of_pets and match
-            def extract_pets_num(service_pets_str):
-                if pd.isna(service_pets_str):
-                    return None
-                service_pets_str = str(service_pets_str).strip().lower()
-                for word in service_pets_str.split():
-                    try:
-                        return int(word)
-                    except ValueError:
-                        continue
-                return None
-            
-            matching_services['_pets_num'] = matching_services['number_of_pets'].apply(extract_pets_num)
-            pets_num_match = matching_services['_pets_num'] == pets_num
-            num_matches = matching_services[pets_num_match]
-            
-            if not num_matches.empty:
-                matching_services = num_matches
-            # If still no match, don't fall back - we need exact match for correct pricing
-    
-    # Remove the temporary column if it exists
-    if '_pets_num' in matching_services.columns:
-        matching_services = matching_services.drop(columns=['_pets_num'])
-    
-    if matching_services.empty:
-        return None
-    
-    service = matching_services.iloc[0]
     tier_num = int(price_tier.split()[-1]) if 'Tier' in price_tier else 1
-    price = calculate_price_rate(service, tier_num)
+    price = calculate_price_rate(price_index[key], tier_num)
     
     return price
 
 
-def get_unique_months(appointments):
-    """Extract unique months from appointments and return formatted list"""
-    if not appointments:
-        return []
-    
-    months_set = set()
+def _index_appointments_by_month(appointments):
+    """Group appointments by (year, month) of their date, keeping their order"""
+    appointments_by_month = defaultdict(list)
     for apt in appointments:
         apt_date = apt.get('date')
         if apt_date and isinstance(apt_date, date):
-            # Format as "Month YYYY" (e.g., "November 2025")
-            month_str = apt_date.strftime('%B %Y')
-            months_set.add((month_str, apt_date.year, apt_date.month))
-    
-    # Sort by year and month
-    sorted_months = sorted(months_set, key=lambda x: (x[1], x[2]))
-    return [month[0] for month in sorted_months]
+            appointments_by_month[(apt_date.year, apt_date.month)].append(apt)
+    return appointments_by_month
+
+
+def get_unique_months(appointments_by_month):
+    """Return formatted labels for the months in an appointments-by-month index"""
+    # Format as "Month YYYY" (e.g., "November 2025"), sorted by year and month
+    return [f"{MONTH_NAMES[month - 1]} {year}" for year, month in sorted(appointments_by_month)]
 
 
-def filter_appointments_by_month(appointments, selected_month):
+def filter_appointments_by_month(appointments, appointments_by_month, selected_month):
     """Filter appointments by selected month"""
     if not appointments or selected_month == "All appointments":
         return appointments
     
-    filtered = []
+    # Parse "Month YYYY" back into a (year, month) key
+    month_name, year = selected_month.rsplit(' ', 1)
+    return appointments_by_month.get((int(year), MONTH_NAMES.index(month_name) + 1), [])
+
+
+def _build_appointments_display(appointments, price_index, include_invoice=False):
+    """Return (display table, invoice lines) for appointments already sorted by date and time
+
+    With include_invoice, each appointment's price feeds both its row and the
+    invoice, so it is only priced once. Otherwise the invoice lines are empty.
+    """
+    rows = []
+    invoice_keys = []
+    invoice_prices = []
     for apt in appointments:
-        apt_date = apt.get('date')
-        if apt_date and isinstance(apt_date, date):
-            month_str = apt_date.strftime('%B %Y')
-            if month_str == selected_month:
-                filtered.append(apt)
+        # Format date and time
+        apt_date = apt['date']
+        start_time = apt['start_time']
+        date_str = f"{apt_date.year:04d}-{apt_date.month:02d}-{apt_date.day:02d}" if isinstance(apt_date, date) else str(apt_date)
+        time_str = f"{start_time.hour:02d}:{start_time.minute:02d}" if isinstance(start_time, time) else str(start_time)
+        
+        # Format duration/end time
+        duration = apt.get('duration')
+        duration_label = format_duration_minutes(duration) if duration is not None else None
+        if duration:
+            duration_display = duration_label
+        elif apt.get('end_time'):
+            end_time = apt['end_time']
+            end_time_str = f"{end_time.hour:02d}:{end_time.minute:02d}" if isinstance(end_time, time) else str(end_time)
+            duration_display = f"Until {end_time_str}"
+        else:
+            duration_display = "N/A"
+        
+        # Calculate price and format Price Tier column
+        price_tier = apt.get('price_tier', '')
+        price = None
+        if price_index:
+            price = calculate_appointment_price(apt, price_index)
+        
+        if price is not None:
+            price_tier_display = f"{price_tier} (£{price:.2f})"
+        else:
+            price_tier_display = price_tier
+        
+        rows.append({
+            'Date': date_str,
+            'Start Time': time_str,
+            'Service Type': apt.get('service_type', 'Unknown'),
+            'Customer': apt.get('customer', 'Unknown'),
+            'Number of Pets': apt.get('number_of_pets', ''),
+            'Duration/End Time': duration_display,
+            'Price Tier': price_tier_display,
+            'Staff Pay Tier': apt.get('staff_pay_tier', ''),
+            'Recurring': 'Yes' if apt.get('is_recurring', False) else 'No'
+        })
+        
+        # Invoice lines only cover duration based appointments
+        if include_invoice and price_index and duration is not None:
+            invoice_keys.append(f"{apt.get('service_type', 'Unknown')} - {duration_label}")
+            invoice_prices.append(price if price is not None else 0.0)
     
-    return filtered
+    invoice_data = aggregate_invoice_data(invoice_keys, invoice_prices) if include_invoice else []
+    return pd.DataFrame(rows), invoice_data
 
 
 def render_appointments_list_tab():
     """Render the Appointments tab showing preview and created appointments"""
     # Show preview of appointments that will be created from sidebar form
     # Generate preview of appointments from current sidebar form state
-    preview_appointments = generate_appointments_from_sections()
+    # Only regenerate when the sections have changed since the last rerun
+    sections = st.session_state.get('appointment_sections', [])
+    fp = _fingerprint(sections)
+    if st.session_state.get('_preview_fp') == fp:
+        preview_appointments = st.session_state['_preview_cache']
+    else:
+        preview_appointments = generate_appointments_from_sections(sections)
+        st.session_state['_preview_fp'] = fp
+        st.session_state['_preview_cache'] = preview_appointments
+    
+    # Price lookups for active services, shared by the invoice and tables below
+    price_index = get_price_index()
     
     # Month filter - placed above the header
     if preview_appointments:
-        unique_months = get_unique_months(preview_appointments)
+        appointments_by_month = _index_appointments_by_month(preview_appointments)
+        unique_months = get_unique_months(appointments_by_month)
         month_options = ["All appointments"] + unique_months
         
         selected_month = st.selectbox(
@@ -1081,7 +1238,9 @@ def render_appointments_list_tab():
         )
         
         # Filter appointments based on selected month
-        filtered_appointments = filter_appointments_by_month(preview_appointments, selected_month)
+        filtered_appointments = filter_appointments_by_month(preview_appointments, appointments_by_month, selected_month)
+        # Sort by date and time
+        filtered_appointments = sorted(filtered_appointments, key=lambda a: (a['date'], a['start_time']))
     else:
         filtered_appointments = []
         selected_month = "All appointments"
@@ -1094,7 +1253,8 @@ def render_appointments_list_tab():
     
     # Customer Invoice Section - placed above appointments
     if filtered_appointments:
-        invoice_data = calculate_invoice_data(filtered_appointments)
+        # Build the table and invoice in one pass over the filtered appointments
+        preview_df, invoice_data = _build_appointments_display(filtered_appointments, price_index, include_invoice=True)
         if invoice_data:
             st.subheader("Customer Invoice")
             
@@ -1120,75 +1280,7 @@ def render_appointments_list_tab():
     st.subheader("Appointments")
     
     if filtered_appointments:
-        # Load services and service types for price calculation
-        services_df = load_csv(SERVICES_CSV)
-        service_types_df = get_service_types()
-        
-        # Prepare merged services if available
-        merged_services = pd.DataFrame()
-        if not services_df.empty and not service_types_df.empty:
-            # Filter to active services
-            if 'is_active' in services_df.columns:
-                services_df['is_active'] = services_df['is_active'].astype(str)
-                services_df = services_df[services_df['is_active'].str.lower() == 'true']
-            
-            # Join with service types to get service type names
-            services_df['service_type_id'] = services_df['service_type_id'].astype(str)
-            service_types_df['id'] = service_types_df['id'].astype(str)
-            merged_services = services_df.merge(
-                service_types_df[['id', 'name']],
-                left_on='service_type_id',
-                right_on='id',
-                how='left'
-            )
-        
-        # Convert to dataframe for display
-        preview_data = []
-        for apt in filtered_appointments:
-            # Format date and time
-            date_str = apt['date'].strftime('%Y-%m-%d') if isinstance(apt['date'], date) else str(apt['date'])
-            time_str = apt['start_time'].strftime('%H:%M') if isinstance(apt['start_time'], time) else str(apt['start_time'])
-            
-            # Format duration/end time
-            if apt.get('duration'):
-                duration_display = format_duration_minutes(apt['duration'])
-            elif apt.get('end_time'):
-                end_time_str = apt['end_time'].strftime('%H:%M') if isinstance(apt['end_time'], time) else str(apt['end_time'])
-                duration_display = f"Until {end_time_str}"
-            else:
-                duration_display = "N/A"
-            
-            # Calculate price and format Price Tier column
-            price_tier = apt.get('price_tier', '')
-            price = None
-            if not merged_services.empty:
-                price = calculate_appointment_price(apt, merged_services)
-            
-            if price is not None:
-                price_tier_display = f"{price_tier} (£{price:.2f})"
-            else:
-                price_tier_display = price_tier
-            
-            preview_data.append({
-                'Date': date_str,
-                'Start Time': time_str,
-                'Service Type': apt.get('service_type', 'Unknown'),
-                'Customer': apt.get('customer', 'Unknown'),
-                'Number of Pets': apt.get('number_of_pets', ''),
-                'Duration/End Time': duration_display,
-                'Price Tier': price_tier_display,
-                'Staff Pay Tier': apt.get('staff_pay_tier', ''),
-                'Recurring': 'Yes' if apt.get('is_recurring', False) else 'No'
-            })
-        
-        if preview_data:
-            preview_df = pd.DataFrame(preview_data)
-            # Sort by date and time
-            preview_df['_sort_date'] = pd.to_datetime(preview_df['Date'] + ' ' + preview_df['Start Time'])
-            preview_df = preview_df.sort_values('_sort_date')
-            preview_df = preview_df.drop(columns=['_sort_date'])
-            
-            st.dataframe(preview_df, use_container_width=True, hide_index=True)
+        st.dataframe(preview_df, use_container_width=True, hide_index=True)
     elif preview_appointments:
         # Preview appointments exist but filter returned no results
         st.info(f"No appointments found for the selected month.")
@@ -1196,82 +1288,15 @@ def render_appointments_list_tab():
         st.info("Complete the form in the sidebar to see a preview of appointments that will be created.")
     
     # Show created appointments (if any)
-    if 'appointments' in st.session_state and st.session_state['appointments']:
+    created_appointments = st.session_state.get('appointments')
+    if created_appointments:
         st.divider()
         st.subheader("Created Appointments")
         
-        created_appointments = st.session_state.get('appointments', [])
-        
-        # Load services and service types for price calculation
-        services_df = load_csv(SERVICES_CSV)
-        service_types_df = get_service_types()
-        
-        # Prepare merged services if available
-        merged_services = pd.DataFrame()
-        if not services_df.empty and not service_types_df.empty:
-            # Filter to active services
-            if 'is_active' in services_df.columns:
-                services_df['is_active'] = services_df['is_active'].astype(str)
-                services_df = services_df[services_df['is_active'].str.lower() == 'true']
-            
-            # Join with service types to get service type names
-            services_df['service_type_id'] = services_df['service_type_id'].astype(str)
-            service_types_df['id'] = service_types_df['id'].astype(str)
-            merged_services = services_df.merge(
-                service_types_df[['id', 'name']],
-                left_on='service_type_id',
-                right_on='id',
-                how='left'
-            )
-        
-        # Convert to dataframe for display
-        created_data = []
-        for apt in created_appointments:
-            # Format date and time
-            date_str = apt['date'].strftime('%Y-%m-%d') if isinstance(apt['date'], date) else str(apt['date'])
-            time_str = apt['start_time'].strftime('%H:%M') if isinstance(apt['start_time'], time) else str(apt['start_time'])
-            
-            # Format duration/end time
-            if apt.get('duration'):
-                duration_display = format_duration_minutes(apt['duration'])
-            elif apt.get('end_time'):
-                end_time_str = apt['end_time'].strftime('%H:%M') if isinstance(apt['end_time'], time) else str(apt['end_time'])
-                duration_display = f"Until {end_time_str}"
-            else:
-                duration_display = "N/A"
-            
-            # Calculate price and format Price Tier column
-            price_tier = apt.get('price_tier', '')
-            price = None
-            if not merged_services.empty:
-                price = calculate_appointment_price(apt, merged_services)
-            
-            if price is not None:
-                price_tier_display = f"{price_tier} (£{price:.2f})"
-            else:
-                price_tier_display = price_tier
-            
-            created_data.append({
-                'Date': date_str,
-                'Start Time': time_str,
-                'Service Type': apt.get('service_type', 'Unknown'),
-                'Customer': apt.get('customer', 'Unknown'),
-                'Number of Pets': apt.get('number_of_pets', ''),
-                'Duration/End Time': duration_display,
-                'Price Tier': price_tier_display,
-                'Staff Pay Tier': apt.get('staff_pay_tier', ''),
-                'Recurring': 'Yes' if apt.get('is_recurring', False) else 'No'
-            })
-        
-        if created_data:
-            created_df = pd.DataFrame(created_data)
-            # Sort by date and time
-            created_df['_sort_date'] = pd.to_datetime(created_df['Date'] + ' ' + created_df['Start Time'])
-            created_df = created_df.sort_values('_sort_date')
-            created_df = created_df.drop(columns=['_sort_date'])
-            
-            st.dataframe(created_df, use_container_width=True, hide_index=True)
-            st.caption(f"Total: {len(created_appointments)} created appointment(s)")
+        created_appointments = sorted(created_appointments, key=lambda a: (a['date'], a['start_time']))
+        created_df, _ = _build_appointments_display(created_appointments, price_index)
+        st.dataframe(created_df, use_container_width=True, hide_index=True)
+        st.caption(f"Total: {len(created_appointments)} created appointment(s)")
 
 
 def render_create_appointment_sidebar():
@@ -1288,10 +1313,18 @@ def render_create_appointment_sidebar():
         st.sidebar.warning("No service types found. Please add service types in the Service Types tab first.")
         return
     
+    # Build service type and duration lookups once for all sections
+    service_type_names = service_types_df['name'].tolist() if 'name' in service_types_df.columns else []
+    name_to_id, name_to_uses = build_service_type_lookups(service_types_df)
+    duration_options_by_type = _duration_options_cached(get_file_mtime(SERVICES_CSV))
+    
     # Render each section in sidebar
     sections = st.session_state.get('appointment_sections', [{}])
     for idx, section_data in enumerate(sections):
-        render_appointment_section(idx, section_data, service_types_df, use_sidebar=True)
+        render_appointment_section(
+            idx, section_data, service_type_names, name_to_id, name_to_uses,
+            duration_options_by_type, use_sidebar=True
+        )
         if idx < len(sections) - 1:
             st.sidebar.divider()
     